@@ -30,6 +30,7 @@ export default function App() {
 
   // Camera ref
   const cameraRef = useRef<CameraView>(null);
+  const [pictureSize, setPictureSize] = useState<string | undefined>(undefined);
 
   // Navigation state
   const {
@@ -49,24 +50,55 @@ export default function App() {
    * Handle press-to-talk: Capture frame + process voice.
    */
   const handleButtonPress = async (audioUri: string) => {
-    // First, process voice input
-    await handleVoiceInput(audioUri);
-    
-    // Then, if navigating, capture and analyze a frame
-    if (state === 'NAVIGATING' && checkpoint && cameraRef.current) {
-      try {
-        const photo = await cameraRef.current.takePictureAsync({
+    // If navigating, capture a frame while the voice input is transcribed
+    // (camera capture overlaps the Whisper round-trip instead of following it)
+    const photoPromise = state === 'NAVIGATING' && checkpoint && cameraRef.current
+      ? cameraRef.current.takePictureAsync({
           quality: 0.5,
           skipProcessing: true,
-        });
-        
-        if (photo?.uri) {
-          console.log('Frame captured:', photo.uri);
-          await handleFrameCapture(photo.uri);
+        }).catch((error) => {
+          console.error('Frame capture error:', error);
+          return undefined;
+        })
+      : Promise.resolve(undefined);
+
+    // Process voice input
+    await handleVoiceInput(audioUri);
+
+    // Then analyze the captured frame
+    try {
+      const photo = await photoPromise;
+      if (photo?.uri) {
+        console.log('Frame captured:', photo.uri);
+        await handleFrameCapture(photo.uri);
+      }
+    } catch (error) {
+      console.error('Frame capture error:', error);
+    }
+  };
+
+  /**
+   * Pick the smallest capture size that still covers the vision model's
+   * 512px input, so frames aren't uploaded at full sensor resolution.
+   */
+  const handleCameraReady = async () => {
+    try {
+      const sizes = await cameraRef.current?.getAvailablePictureSizesAsync();
+      let best: { size: string; pixels: number } | null = null;
+      for (const size of sizes ?? []) {
+        const match = /^(\d+)x(\d+)$/.exec(size);
+        if (!match) continue;
+        const [w, h] = [Number(match[1]), Number(match[2])];
+        if (Math.max(w, h) < 512) continue;
+        if (!best || w * h < best.pixels) {
+          best = { size, pixels: w * h };
         }
-      } catch (error) {
-        console.error('Frame capture error:', error);
       }
+      if (best) {
+        setPictureSize(best.size);
+      }
+    } catch (error) {
+      console.error('Picture size lookup error:', error);
     }
   };
 
@@ -202,6 +234,8 @@ export default function App() {
         ref={cameraRef}
         style={styles.camera}
         facing="back"
+        pictureSize={pictureSize}
+        onCameraReady={handleCameraReady}
       />
 
       {/* Overlay UI */}
@@ -12,10 +12,12 @@ const SERVER_URL = Constants.expoConfig?.extra?.serverUrl || 'http://localhost:8
 
 console.log('API Server URL:', SERVER_URL);
 
+const REQUEST_TIMEOUT_MS = 30000;
+
 // Create axios instance
 const api: AxiosInstance = axios.create({
   baseURL: SERVER_URL,
-  timeout: 30000, // 30s timeout for TTS/STT
+  timeout: REQUEST_TIMEOUT_MS, // 30s timeout for TTS/STT
   headers: {
     'Content-Type': 'application/json',
   },
@@ -159,29 +161,44 @@ export async function postPlan(
 ): Promise<PlanResponse> {
   try {
     if (imageUri) {
-      // Send with image for GPT-4o vision analysis
-      const formData = new FormData();
-      formData.append('checkpoint', checkpoint);
-      formData.append('detections', JSON.stringify(detections));
-      formData.append('recent_instructions', JSON.stringify(recentInstructions));
-      formData.append('history_snippets', JSON.stringify(historySnippets));
-      formData.append('language', language);
+      // Send raw JPEG body with context in a header (no multipart parsing).
+      // history_snippets is left out: the server doesn't use it, and
+      // percent-encoded non-ASCII text would push the header past its limit.
+      const context = JSON.stringify({
+        checkpoint,
+        detections,
+        recent_instructions: recentInstructions,
+        language,
+      });
       
-      // Append image
-      const filename = imageUri.split('/').pop() || 'frame.jpg';
-      formData.append('image', {
-        uri: imageUri,
-        type: 'image/jpeg',
-        name: filename,
-      } as any);
+      // Read the captured frame as a blob
+      const image = await (await fetch(imageUri)).blob();
       
-      const response = await api.post('/plan', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-      });
+      // Same timeout as the axios client
+      const controller = new AbortController();
+      const timer = setTimeout(() => controller.abort(), REQUEST_TIMEOUT_MS);
       
-      const validated = PlanResponseSchema.parse(response.data);
+      let response: Response;
+      try {
+        response = await fetch(`${SERVER_URL}/plan`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'image/jpeg',
+            // Headers are Latin-1 only, so percent-encode non-ASCII checkpoints
+            'X-Seer-Context': encodeURIComponent(context),
+          },
+          body: image,
+          signal: controller.signal,
+        });
+      } finally {
+        clearTimeout(timer);
+      }
+      
+      if (!response.ok) {
+        throw new Error(`Plan request failed: ${response.status}`);
+      }
+      
+      const validated = PlanResponseSchema.parse(await response.json());
       return validated;
     } else {
       // JSON only (no image)
@@ -94,6 +94,9 @@ export function useNavigationLoop(): UseNavigationLoopReturn {
         recentInstructions.current.shift();
       }
       historySnippets.current.push(`seer: ${text}`);
+      if (historySnippets.current.length > 10) {
+        historySnippets.current.shift();
+      }
     } catch (error) {
       console.error('TTS playback error:', error);
       // Fallback: just show the text
@@ -192,7 +195,7 @@ export function useNavigationLoop(): UseNavigationLoopReturn {
         recentInstructions.current,
         historySnippets.current,
         imageUri,  // Send camera image to GPT-4o!
-        language.whisperCode  // Language for LLM response
+        language.whisperCode  // Language for LLM response (server mirrors the frame)
       );
 
       console.log('Plan:', planResult);
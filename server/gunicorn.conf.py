@@ -0,0 +1,39 @@
+"""
+Gunicorn config for running Seer in production.
+
+Usage (from server/):
+    gunicorn -c gunicorn.conf.py main:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+
+# One process keeps a single copy of the models in RAM/VRAM;
+# threads overlap IO-bound OpenAI calls with CPU-bound work
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+# Load the app (and any models) once in the parent before forking
+preload_app = True
+
+# Vision calls can take a few seconds
+timeout = 60
+keepalive = 5
+
+# /plan sends its context in the percent-encoded X-Seer-Context header,
+# where non-English text takes ~9 bytes per character (default is 8190)
+limit_request_field_size = 32768
+
+
+def post_worker_init(worker):
+    """
+    Start this worker's log listener (the master's thread isn't forked)
+    and, when enabled, its YOLO process (never started in the master).
+    """
+    from main import configure_logging, YOLO_PRELOAD
+    from yolo_server import start_detector_client
+    configure_logging()
+    if YOLO_PRELOAD:
+        start_detector_client()
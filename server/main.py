@@ -4,33 +4,127 @@ Provides endpoints for STT, TTS, object detection, and navigation planning.
 """
 
 import os
-import json
+import base64
+import binascii
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import unquote
+import orjson
 from flask import Flask, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
-from stt import transcribe_audio
+from stt import transcribe_audio, get_whisper_client
 from tts import synthesize_speech, STATIC_DIR
-from plan import generate_instruction
-from state import update_scene, get_scene, clear_scene
+from plan import generate_instruction, estimate_depths_and_positions, get_vision_client
+from state import update_scene, get_scene, clear_scene, MAX_RECENT_INSTRUCTIONS
+from yolo_server import get_detector_client, start_detector_client
 
 # Load environment variables
 load_dotenv()
 
-# Create Flask app
-app = Flask(__name__)
+
+# Process whose listener thread is draining the log queue
+_log_pid = None
+
+def configure_logging():
+    """
+    Route all logging through a queue.
+    Request threads only enqueue records; a listener thread does the I/O.
+    
+    Threads don't survive fork, so each process needs its own listener:
+    gunicorn calls this again in every worker (see gunicorn.conf.py).
+    Repeat calls in the same process are no-ops.
+    """
+    global _log_pid
+    if _log_pid == os.getpid():
+        return
+    _log_pid = os.getpid()
+    
+    log_queue = queue.SimpleQueue()
+    
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    
+    listener.start()
+    atexit.register(listener.stop)
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (faster encode/decode, NumPy aware)."""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+# Create Flask app (no built-in static route: serve_static below owns /static)
+app = Flask(__name__, static_folder=None)
+app.json = ORJSONProvider(app)
 
 # Enable CORS for Expo
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Let a fronting web server send static files (X-Sendfile, zero-copy)
+app.use_x_sendfile = os.getenv('USE_X_SENDFILE', '0') == '1'
+
+# Run YOLO alongside the vision call on /plan (requires torch + ultralytics)
+PLAN_WITH_YOLO = os.getenv('PLAN_WITH_YOLO', '0') == '1'
+
+# Start the YOLO process with each worker instead of on the first request
+YOLO_PRELOAD = os.getenv('YOLO_PRELOAD', '1' if PLAN_WITH_YOLO else '0') == '1'
+
+# Upload limits (file parts spool to a temp file, non-file fields stay small)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max
+app.config['MAX_FORM_MEMORY_SIZE'] = 500 * 1024  # 500KB per form field
+
+# Create OpenAI clients once at startup (fails fast on a missing key)
+try:
+    get_whisper_client()
+    get_vision_client()
+except ValueError as e:
+    logger.error("OpenAI client setup failed: %s", e)
 
-print("✅ Seer server ready! Using OpenAI for everything.")
+logger.info("✅ Seer server ready! Using OpenAI for everything.")
+
+
+def parse_context_header(value: str) -> dict:
+    """
+    Decode the X-Seer-Context header sent with raw image uploads.
+    
+    Accepts plain JSON, percent-encoded JSON, or base64-encoded JSON
+    (headers are Latin-1 only, so non-ASCII checkpoints must be encoded).
+    
+    Raises:
+        ValueError: Malformed JSON (orjson.JSONDecodeError)
+        binascii.Error: Malformed base64
+    """
+    value = value.strip()
+    if not value:
+        return {}
+    if value.startswith('{'):
+        return orjson.loads(value)
+    if value.startswith('%'):
+        return orjson.loads(unquote(value))
+    return orjson.loads(base64.b64decode(value))
 
 
 # ============================================================================
@@ -43,7 +137,7 @@ def root():
     return jsonify({
         "status": "ok",
         "message": "Seer API - OpenAI powered vision navigation",
-        "endpoints": ["/stt", "/tts", "/plan", "/scene"],
+        "endpoints": ["/stt", "/tts", "/detect", "/plan", "/scene"],
         "powered_by": "OpenAI (Whisper + GPT-4o-mini Vision)"
     })
 
@@ -71,16 +165,13 @@ def speech_to_text():
         # Get language (defaults to English)
         language = request.form.get('language', 'en')
         
-        # Read audio bytes
-        audio_bytes = audio_file.read()
-        
-        # Transcribe in selected language
-        text = transcribe_audio(audio_bytes, audio_file.filename or "audio.m4a", language)
+        # Stream the spooled upload straight to Whisper (no full read into memory)
+        text = transcribe_audio(audio_file.stream, audio_file.filename or "audio.m4a", language)
         
         return jsonify({"text": text})
     
     except Exception as e:
-        print(f"STT error: {e}")
+        logger.error("STT error: %s", e)
         return jsonify({"error": f"Speech-to-text failed: {str(e)}"}), 500
 
 
@@ -108,22 +199,52 @@ def text_to_speech():
         return jsonify({"text": result})
     
     except Exception as e:
-        print(f"TTS error: {e}")
+        logger.error("TTS error: %s", e)
         return jsonify({"error": f"Text-to-speech failed: {str(e)}"}), 500
 
 
+@app.route('/detect', methods=['POST'])
+def detect_objects():
+    """
+    Detect objects with YOLO (runs in a dedicated inference process).
+    
+    Expects:
+        image: Image file (JPEG)
+        
+    Returns:
+        JSON: {"img_w": int, "img_h": int, "detections": [...]}
+    """
+    try:
+        if 'image' not in request.files:
+            return jsonify({"error": "No image file provided"}), 400
+        
+        # Bytes are shipped to the inference process; Flask never touches torch
+        image_bytes = request.files['image'].stream.read()
+        
+        result = get_detector_client().detect(
+            image_bytes,
+            timeout=float(os.getenv('YOLO_TIMEOUT', 5))
+        )
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error("Detection error: %s", e)
+        return jsonify({"error": f"Object detection failed: {str(e)}"}), 500
+
+
 @app.route('/plan', methods=['POST'])
 def plan_navigation():
     """
     Generate navigation instruction using GPT-4o-mini vision.
     
-    Expects:
-        Form data with:
-            - checkpoint (str)
-            - detections (JSON string)
-            - recent_instructions (JSON string)
-            - history_snippets (JSON string)
-            - image (file, optional) - camera frame for vision analysis
+    Expects one of:
+        Raw image body (Content-Type: image/jpeg) with header
+            X-Seer-Context: JSON with checkpoint, detections,
+            recent_instructions, language,
+            mirrored (frame already mirrored on device)
+        JSON body with the same fields (no image)
+        Form data with the same fields + image file (deprecated)
         
     Returns:
         JSON: {
@@ -134,21 +255,40 @@ def plan_navigation():
         }
     """
     try:
-        # Check if multipart (with image) or JSON
-        if request.content_type and 'multipart/form-data' in request.content_type:
-            # Multipart: image + data
+        content_type = request.content_type or ''
+        
+        # Check if raw image, multipart (deprecated) or JSON
+        if content_type.startswith('image/'):
+            # Raw image body + context header (no multipart parsing)
+            try:
+                context = parse_context_header(request.headers.get('X-Seer-Context', ''))
+            except (ValueError, binascii.Error) as e:
+                return jsonify({"error": f"Invalid X-Seer-Context header: {e}"}), 400
+            if not isinstance(context, dict):
+                return jsonify({"error": "Invalid X-Seer-Context header: expected a JSON object"}), 400
+            checkpoint = context.get('checkpoint')
+            detections = context.get('detections', [])
+            recent_instructions = context.get('recent_instructions', [])
+            history_snippets = context.get('history_snippets', [])
+            language = context.get('language', 'en')
+            flip_image = not context.get('mirrored', False)
+            
+            image_stream = request.stream
+            logger.debug("📸 Received image: %s bytes", request.content_length)
+        elif 'multipart/form-data' in content_type:
+            # Multipart: image + data (deprecated, kept for older clients)
             checkpoint = request.form.get('checkpoint')
-            detections = json.loads(request.form.get('detections', '[]'))
-            recent_instructions = json.loads(request.form.get('recent_instructions', '[]'))
-            history_snippets = json.loads(request.form.get('history_snippets', '[]'))
+            detections = orjson.loads(request.form.get('detections', '[]'))
+            recent_instructions = orjson.loads(request.form.get('recent_instructions', '[]'))
+            history_snippets = orjson.loads(request.form.get('history_snippets', '[]'))
             language = request.form.get('language', 'en')
+            flip_image = request.form.get('mirrored', 'false') != 'true'
             
-            # Get image if provided
-            image_bytes = None
+            # Get image stream if provided (left spooled, decoded lazily)
+            image_stream = None
             if 'image' in request.files:
-                image_file = request.files['image']
-                image_bytes = image_file.read()
-                print(f"📸 Received image: {len(image_bytes)} bytes")
+                image_stream = request.files['image'].stream
+                logger.debug("📸 Received image upload (%s bytes total)", request.content_length)
         else:
             # JSON only (no image)
             data = request.get_json()
@@ -160,11 +300,27 @@ def plan_navigation():
             recent_instructions = data.get('recent_instructions', [])
             history_snippets = data.get('history_snippets', [])
             language = data.get('language', 'en')
-            image_bytes = None
+            flip_image = not data.get('mirrored', False)
+            image_stream = None
         
         if not checkpoint:
             return jsonify({"error": "No checkpoint provided"}), 400
         
+        # Bound client-supplied history once at ingest
+        recent_instructions = (recent_instructions or [])[-MAX_RECENT_INSTRUCTIONS:]
+        
+        # Optionally run YOLO on the frame while the vision call is in flight
+        image_bytes = None
+        detection_future = None
+        if PLAN_WITH_YOLO and image_stream is not None and not detections:
+            image_bytes = image_stream.read()
+            image_stream = None
+            try:
+                detection_future = get_detector_client().submit(image_bytes)
+            except Exception as e:
+                # YOLO is optional here; plan from vision alone
+                logger.error("Detection error: %s", e)
+        
         # Generate instruction (with vision if image provided, in selected language)
         result = generate_instruction(
             checkpoint=checkpoint,
@@ -172,18 +328,32 @@ def plan_navigation():
             recent_instructions=recent_instructions,
             history_snippets=history_snippets,
             image_bytes=image_bytes,
-            language=language
+            image_stream=image_stream,
+            language=language,
+            flip_image=flip_image,
+            detection_future=detection_future
         )
         
+        # Join detections so the scene state knows about nearby obstacles
+        if detection_future is not None:
+            try:
+                detected = detection_future.result(timeout=float(os.getenv('YOLO_TIMEOUT', 5)))
+                detections = estimate_depths_and_positions(
+                    detected["detections"],
+                    detected["img_w"],
+                    detected["img_h"]
+                )
+                result["detections"] = detections
+            except Exception as e:
+                logger.error("Detection error: %s", e)
+        
         # Update server state
         update_scene(checkpoint, detections, result)
         
         return jsonify(result)
     
     except Exception as e:
-        print(f"Planning error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Planning error: %s", e)
         return jsonify({"error": f"Navigation planning failed: {str(e)}"}), 500
 
 
@@ -196,10 +366,15 @@ def get_current_scene():
 @app.route('/static/<path:filename>')
 def serve_static(filename):
     """Serve static files (MP3 audio files)."""
-    print(f"📡 Serving static file: {filename}")
-    response = send_from_directory(str(STATIC_DIR), filename)
-    response.headers['Content-Type'] = 'audio/mpeg'
-    return response
+    logger.debug("📡 Serving static file: %s", filename)
+    # Conditional: ETag/Last-Modified give 304s on replay, Range gives 206s
+    return send_from_directory(
+        str(STATIC_DIR),
+        filename,
+        mimetype='audio/mpeg',
+        conditional=True,
+        max_age=3600
+    )
 
 
 # ============================================================================
@@ -221,13 +396,22 @@ def internal_error(error):
 # ============================================================================
 
 if __name__ == '__main__':
+    # Development server only; use gunicorn in production:
+    #   gunicorn -c gunicorn.conf.py main:app
     port = int(os.getenv('PORT', 8000))
     print(f"\n🔮 Starting Seer server on http://0.0.0.0:{port}")
     print(f"📖 API endpoints: http://localhost:{port}/")
     print(f"Press Ctrl+C to stop\n")
     
+    debug = os.getenv('FLASK_DEBUG', '0') == '1'
+    
+    # With the reloader, only the serving child starts the YOLO process
+    if YOLO_PRELOAD and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_detector_client()
+    
     app.run(
         host='0.0.0.0',
         port=port,
-        debug=True
+        debug=debug,
+        threaded=True
     )
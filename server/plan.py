@@ -3,13 +3,47 @@ Navigation planning with depth estimation and spatial awareness.
 """
 
 import os
-import json
+import sys
+import time
+import logging
 import base64
+import threading
+import importlib.util
 from io import BytesIO
-from typing import List, Dict, Any, Optional
-from openai import OpenAI, AzureOpenAI
+from itertools import islice
+from types import MappingProxyType
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, BinaryIO, Sequence
+import numpy as np
+import httpx
+import orjson
+from openai import OpenAI, AzureOpenAI, APITimeoutError
 from PIL import Image
 
+from plan_cache import PlanCache, SemanticPlanCache, plan_cache_key, scene_bucket, perceptual_hash
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Optional: libjpeg-turbo SIMD encoder (one instance, library loaded once)
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    _turbo_jpeg = None
+
+# Optional: OpenCV SIMD resize/flip/encode
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# detail="low" looks at a 512x512 version, so never send more pixels
+VISION_SIZE = 512
+VISION_QUALITY = 75
+
 
 # Natural, descriptive guidance for visually impaired users
 SYSTEM_PROMPT = """You are Seer, a friendly AI guide for a BLIND user navigating indoors.
@@ -39,15 +73,89 @@ Examples:
 - RIGHT AT IT (fills frame) → "Perfect! You're at the door!" (reached: TRUE)
 - Obstacle → "Stop! Chair directly ahead, two feet away." (warning, reached: FALSE)
 
-Output JSON:
-{
-  "instruction": "descriptive guidance",
-  "urgency": "normal or warning",
-  "reached": true/false,
-  "danger_level": "safe or caution or danger"
-}
+Always answer by calling emit_instruction.
 """
 
+# Vision instructions (static: the per-tick context follows as JSON)
+FIRST_FRAME_PROMPT = """Look at what the camera sees. DESCRIBE what's there.
+
+If you see the destination: "I see the [destination] straight ahead!"
+If you don't see it: "I see [what's actually there]. Let's find the [destination]."
+
+USER IS BLIND - DESCRIBE, don't ask questions!
+SHORT (10-15 words).
+
+Next message: {"target": destination, "recent": [], "lang": language}.
+**RESPOND IN lang**"""
+
+NEXT_FRAME_PROMPT = """Look at the camera view. DESCRIBE what you see:
+- What's directly in their path?
+- Any obstacles or dangers?
+- Where is the destination relative to them?
+
+USER IS BLIND - DESCRIBE clearly, don't ask!
+SHORT (10-15 words).
+
+Next message: {"target": destination, "recent": recent guidance, "lang": language}.
+**RESPOND IN lang**"""
+
+# Response language names (read-only, uppercased and interned once at import)
+LANG_NAMES = MappingProxyType({
+    sys.intern(code): sys.intern(name.upper()) for code, name in {
+        'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German',
+        'it': 'Italian', 'pt': 'Portuguese', 'hi': 'Hindi', 'ar': 'Arabic',
+        'ru': 'Russian', 'zh': 'Chinese', 'ja': 'Japanese', 'ko': 'Korean'
+    }.items()
+})
+
+# Identical objects on every call so the prompt prefix is byte-for-byte stable
+# (OpenAI/Azure cache repeated prefixes and skip their prefill)
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+FIRST_FRAME_MESSAGE = {"role": "user", "content": FIRST_FRAME_PROMPT}
+NEXT_FRAME_MESSAGE = {"role": "user", "content": NEXT_FRAME_PROMPT}
+
+# The plan is returned as forced tool-call arguments: field names and
+# allowed values live in the schema instead of the prompt and output
+PLAN_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "emit_instruction",
+        "description": "Speak one navigation instruction to the user.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "instruction": {"type": "string", "maxLength": 80},
+                "urgency": {"enum": ["normal", "warning"]},
+                "reached": {"type": "boolean"},
+                "danger_level": {"enum": ["safe", "caution", "danger"]}
+            },
+            "required": ["instruction", "urgency", "reached", "danger_level"]
+        }
+    }
+}
+PLAN_TOOLS = [PLAN_TOOL]
+PLAN_TOOL_CHOICE = {"type": "function", "function": {"name": "emit_instruction"}}
+
+
+def compact_json(value: Any) -> str:
+    """
+    Serialize prompt context as compact, canonical JSON.
+    No indentation/spaces and no \\u escapes for non-English text,
+    both of which inflate the prompt token count. Keys are sorted so
+    the same context always produces the same bytes.
+    """
+    return orjson.dumps(value, option=orjson.OPT_SORT_KEYS).decode()
+
+
+def intern_label(value: Any) -> Any:
+    """Intern enum-like string fields ("normal", "safe", ...) from model output."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def recent_tail(recent: Sequence[str], n: int) -> List[str]:
+    """Last n entries, oldest first (works for lists, tuples and deques)."""
+    return list(islice(reversed(recent), n))[::-1]
+
 
 def estimate_depth_and_position(detection: Dict, img_w: int, img_h: int) -> Dict:
     """
@@ -66,52 +174,117 @@ def estimate_depth_and_position(detection: Dict, img_w: int, img_h: int) -> Dict
     Returns:
         Enhanced detection with distance and position
     """
-    cx, cy, w, h = detection["xywh"]
+    return estimate_depths_and_positions([detection], img_w, img_h)[0]
+
+
+def detection_prompt(
+    checkpoint: str,
+    detections: List[Dict[str, Any]],
+    recent_instructions: Sequence[str],
+    language: str = "en",
+    img_w: int = 1280,
+    img_h: int = 720
+) -> str:
+    """
+    Build the text-only prompt describing the scene from YOLO detections.
     
-    # Estimate distance (rough approximation)
-    # Objects lower in frame and larger are closer
-    vertical_ratio = cy / img_h  # 0 = top, 1 = bottom
-    size_ratio = (w * h) / (img_w * img_h)  # How much of frame it occupies
+    Args:
+        checkpoint: Target destination
+        detections: Raw YOLO detections
+        recent_instructions: Recent navigation history
+        language: ISO language code for the response
+        img_w: Width of the frame the detections came from
+        img_h: Height of the frame the detections came from
+        
+    Returns:
+        User message for the planner
+    """
+    enhanced_detections = estimate_depths_and_positions(detections, img_w, img_h, top_k=5)
     
-    # Distance estimation (feet)
-    # Lower + larger = closer
-    if vertical_ratio > 0.7 and size_ratio > 0.1:
-        distance = "1-2 feet"
-        distance_value = 1.5
-    elif vertical_ratio > 0.6 and size_ratio > 0.05:
-        distance = "2-4 feet"
-        distance_value = 3
-    elif vertical_ratio > 0.5:
-        distance = "4-6 feet"
-        distance_value = 5
-    elif vertical_ratio > 0.4:
-        distance = "6-10 feet"
-        distance_value = 8
-    else:
-        distance = "10+ feet"
-        distance_value = 12
+    scene_description = []
+    for det in enhanced_detections:
+        desc = f"- {det['object']}: {det['distance']} away, {det['position']} side"
+        if det['is_direct_obstacle']:
+            desc += " ⚠️ BLOCKING PATH"
+        scene_description.append(desc)
     
-    # Horizontal position
-    horizontal_ratio = cx / img_w
-    if horizontal_ratio < 0.33:
-        position = "left"
-    elif horizontal_ratio > 0.67:
-        position = "right"
-    else:
-        position = "center"
+    return f"""Instruction for:
+
+Target: {checkpoint}
+
+Recent: {compact_json(recent_tail(recent_instructions, 3) if recent_instructions else ["Starting"])}
+
+Scene: {chr(10).join(scene_description) if scene_description else "Clear path"}
+
+**RESPOND IN {LANG_NAMES.get(language, "ENGLISH")}**"""
+
+
+# Distance buckets, nearest first. A detection falls in the first bucket
+# whose vertical AND size thresholds it exceeds; the last row always matches.
+_VERTICAL_THRESHOLDS = np.array([0.7, 0.6, 0.5, 0.4, -np.inf])
+_SIZE_THRESHOLDS = np.array([0.1, 0.05, -np.inf, -np.inf, -np.inf])
+_DISTANCE_LABELS = ("1-2 feet", "2-4 feet", "4-6 feet", "6-10 feet", "10+ feet")
+_DISTANCE_FEET = (1.5, 3, 5, 8, 12)
+_POSITION_LABELS = ("left", "center", "right")
+
+
+def estimate_depths_and_positions(
+    detections: List[Dict[str, Any]],
+    img_w: int,
+    img_h: int,
+    top_k: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Vectorized estimate_depth_and_position over all detections at once.
     
-    # Is this a direct obstacle? (center + close)
-    is_obstacle = position == "center" and distance_value < 4
+    Same heuristics, computed with NumPy over an (N, 4) xywh array; only
+    the top_k nearest detections are turned back into dicts.
     
-    return {
-        "object": detection["cls"],
-        "confidence": detection["conf"],
-        "distance": distance,
-        "distance_feet": distance_value,
-        "position": position,
-        "is_direct_obstacle": is_obstacle,
-        "raw_xywh": detection["xywh"]
-    }
+    Args:
+        detections: YOLO detections with xywh
+        img_w: Image width
+        img_h: Image height
+        top_k: Keep only the k nearest (None = all)
+        
+    Returns:
+        Enhanced detections, nearest first (ties keep input order)
+    """
+    n = len(detections)
+    if n == 0:
+        return []
+    
+    xywh = np.array([det["xywh"] for det in detections], dtype=np.float64)
+    vertical_ratio = xywh[:, 1] / img_h
+    size_ratio = (xywh[:, 2] * xywh[:, 3]) / (img_w * img_h)
+    horizontal_ratio = xywh[:, 0] / img_w
+    
+    # Distance bucket: 0 = 1-2 feet ... 4 = 10+ feet
+    bucket = (
+        (vertical_ratio[:, None] > _VERTICAL_THRESHOLDS) & (size_ratio[:, None] > _SIZE_THRESHOLDS)
+    ).argmax(axis=1)
+    position = np.where(horizontal_ratio < 0.33, 0, np.where(horizontal_ratio > 0.67, 2, 1))
+    
+    # Nearest first; unique key (bucket, index) keeps the order stable
+    order_key = bucket * n + np.arange(n)
+    if top_k is not None and top_k < n:
+        keep = np.argpartition(order_key, top_k - 1)[:top_k]
+    else:
+        keep = np.arange(n)
+    keep = keep[np.argsort(order_key[keep])]
+    
+    enhanced = []
+    for i, b, p in zip(keep.tolist(), bucket[keep].tolist(), position[keep].tolist()):
+        detection = detections[i]
+        enhanced.append({
+            "object": detection["cls"],
+            "confidence": detection["conf"],
+            "distance": _DISTANCE_LABELS[b],
+            "distance_feet": _DISTANCE_FEET[b],
+            "position": _POSITION_LABELS[p],
+            "is_direct_obstacle": p == 1 and _DISTANCE_FEET[b] < 4,
+            "raw_xywh": detection["xywh"]
+        })
+    return enhanced
 
 
 def create_planning_client():
@@ -134,13 +307,205 @@ def create_planning_client():
     return OpenAI(api_key=api_key)
 
 
+# Global vision client (created on first use, reused across requests)
+_vision_client = None
+
+def get_vision_client() -> OpenAI:
+    """Get or create the shared OpenAI vision client (keeps connections alive)."""
+    global _vision_client
+    if _vision_client is None:
+        openai_key = os.getenv("OPENAI_API_KEY")
+        if not openai_key:
+            raise ValueError("OPENAI_API_KEY required for vision")
+        
+        _vision_client = OpenAI(
+            api_key=openai_key,
+            http_client=httpx.Client(
+                http2=_HTTP2,
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60)
+            )
+        )
+    return _vision_client
+
+
+def encode_vision_frame(img: Image.Image, flip: bool = True) -> bytes:
+    """
+    Prepare a camera frame for the vision model.
+    
+    Fits the frame into VISION_SIZE x VISION_SIZE (keeping aspect ratio),
+    mirrors it horizontally and encodes JPEG with 4:2:0 chroma.
+    Resizes, flips and encodes with OpenCV (SIMD) when installed, encodes
+    with libjpeg-turbo when installed, otherwise uses Pillow throughout.
+    
+    Args:
+        img: Decoded camera frame
+        flip: Mirror horizontally (iOS camera issue)
+        
+    Returns:
+        JPEG bytes
+    """
+    img = img.convert('RGB')
+    
+    if cv2 is None:
+        img.thumbnail((VISION_SIZE, VISION_SIZE), Image.BILINEAR)
+        
+        if _turbo_jpeg is not None:
+            rgb = np.asarray(img)
+            if flip:
+                rgb = rgb[:, ::-1]  # Strided view; copied once for the encoder
+            return _turbo_jpeg.encode(
+                np.ascontiguousarray(rgb),
+                quality=VISION_QUALITY,
+                pixel_format=TJPF_RGB,
+                jpeg_subsample=TJSAMP_420
+            )
+        
+        if flip:
+            img = img.transpose(Image.FLIP_LEFT_RIGHT)
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=VISION_QUALITY, optimize=True, subsampling=2)
+        return buffer.getvalue()
+    
+    rgb = np.asarray(img)
+    h, w = rgb.shape[:2]
+    scale = VISION_SIZE / max(h, w)
+    if scale < 1:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+    if flip:
+        rgb = cv2.flip(rgb, 1)
+    
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(
+            rgb,
+            quality=VISION_QUALITY,
+            pixel_format=TJPF_RGB,
+            jpeg_subsample=TJSAMP_420
+        )
+    
+    ok, encoded = cv2.imencode(
+        '.jpg',
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR),
+        [cv2.IMWRITE_JPEG_QUALITY, VISION_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+    )
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes()
+
+
+def stream_json_completion(
+    client: OpenAI,
+    model: str,
+    messages: List[Dict[str, Any]],
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Stream a forced emit_instruction tool call and stop once its arguments close.
+    
+    The arguments are consumed token by token. Only a closing brace can
+    complete the object, so the buffer up to the last brace is handed to
+    orjson whenever one arrives; once it parses, the stream is closed so
+    trailing tokens aren't waited on.
+    
+    Args:
+        client: OpenAI client
+        model: Model name
+        messages: Chat messages
+        timeout: Total deadline in seconds for the whole call, streaming
+            included (no retries when set)
+        
+    Returns:
+        The parsed tool-call arguments
+        
+    Raises:
+        TimeoutError: The deadline passed before the arguments closed
+    """
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+        client = client.with_options(timeout=timeout, max_retries=0)
+    
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=0.3,
+        max_tokens=150,
+        tools=PLAN_TOOLS,
+        tool_choice=PLAN_TOOL_CHOICE,
+        stream=True
+    )
+    
+    # httpx timeouts bound each read, not the call; close the stream at the deadline
+    watchdog = None
+    if deadline is not None:
+        watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), stream.close)
+        watchdog.daemon = True
+        watchdog.start()
+    
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            tool_calls = chunk.choices[0].delta.tool_calls
+            if not tool_calls or not tool_calls[0].function:
+                continue
+            delta = tool_calls[0].function.arguments
+            if not delta:
+                continue
+            parts.append(delta)
+            if '}' not in delta:
+                continue
+            # Closing brace may end the object (or sit inside a string)
+            buffer = "".join(parts)
+            try:
+                return orjson.loads(buffer[:buffer.rindex('}') + 1])
+            except orjson.JSONDecodeError:
+                continue
+    except Exception:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Plan completion exceeded {timeout}s") from None
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        stream.close()
+    
+    if deadline is not None and time.monotonic() >= deadline:
+        raise TimeoutError(f"Plan completion exceeded {timeout}s")
+    return orjson.loads("".join(parts))
+
+
+# Give up on the vision call after this long and plan from detections
+VISION_TIMEOUT = float(os.getenv("PLAN_VISION_TIMEOUT", 2.0))
+
+# Detection-only plans: exact prompt match, short TTL (user standing still)
+_plan_cache = PlanCache(ttl=2.0, max_size=256)
+
+# Vision plans: same target/classes/turn + near-identical frame (pHash).
+# The client sends a frame every 5 s plus plan latency, so the TTL must
+# span at least one tick to ever hit. Trade-off: with no detections in the
+# bucket, a hit replays a plan up to TTL seconds old on pHash alone, and a
+# new obstacle that barely changes the low-frequency image can be missed.
+# Set PLAN_SEMANTIC_CACHE_TTL=0 to disable (also skips the pHash).
+SEMANTIC_CACHE_TTL = float(os.getenv("PLAN_SEMANTIC_CACHE_TTL", 12.0))
+_semantic_cache = (
+    SemanticPlanCache(ttl=SEMANTIC_CACHE_TTL, max_size=256, max_distance=4)
+    if SEMANTIC_CACHE_TTL > 0 else None
+)
+
+
 def generate_instruction(
     checkpoint: str,
     detections: List[Dict[str, Any]],
-    recent_instructions: List[str],
+    recent_instructions: Sequence[str],
     history_snippets: List[str],
+    *,
     image_bytes: Optional[bytes] = None,
-    language: str = "en"
+    language: str = "en",
+    image_stream: Optional[BinaryIO] = None,
+    flip_image: bool = True,
+    detection_future: Optional[Future] = None
 ) -> Dict[str, Any]:
     """
     Generate navigation instruction with spatial awareness.
@@ -150,144 +515,156 @@ def generate_instruction(
         detections: Raw YOLO detections
         recent_instructions: Recent navigation history
         history_snippets: Conversation context
+        image_bytes: Camera frame as JPEG bytes (optional)
+        language: ISO language code for the response
+        image_stream: Camera frame as a file-like stream (optional,
+            used instead of image_bytes to avoid buffering the upload)
+        flip_image: Mirror the frame server-side (False when the client
+            already mirrored it on device)
+        detection_future: Server-side YOLO result for this frame (optional,
+            used as the fallback when the client sent no detections)
         
     Returns:
         Instruction with urgency and spatial info
     """
-    # Use standard OpenAI for vision (simpler, always works)
-    openai_key = os.getenv("OPENAI_API_KEY")
-    if not openai_key:
-        raise ValueError("OPENAI_API_KEY required for vision")
+    cache_key = None
+    bucket = phash = None
     
-    client = OpenAI(api_key=openai_key)
+    # Use standard OpenAI for vision (simpler, always works)
+    client = get_vision_client()
     model = "gpt-4o-mini"  # Standard OpenAI with vision support
     
     # Call LLM with vision if image provided
     try:
-        if image_bytes:
+        # Identical detection-only requests within a couple of seconds reuse the plan
+        # (inside the try: malformed detections get the fallback, not a 500)
+        if not image_bytes and image_stream is None:
+            cache_key = plan_cache_key(checkpoint, detections, recent_instructions, language)
+            cached = _plan_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        if image_bytes or image_stream is not None:
             # Use GPT-4o-mini VISION to see the actual image
-            print(f"🔍 Using vision model to analyze image ({len(image_bytes)} bytes)")
+            logger.debug("🔍 Using vision model to analyze image")
             
-            # Flip image vertically (iOS camera issue)
+            if image_stream is not None:
+                image_bytes = image_stream.read()
             img = Image.open(BytesIO(image_bytes))
-            img_flipped = img.transpose(Image.FLIP_LEFT_RIGHT)  # Mirror horizontally
+            original_size = img.size
+            img.draft('RGB', (VISION_SIZE, VISION_SIZE))  # Reduced-scale JPEG decode
             
-            # Convert back to bytes
-            buffer = BytesIO()
-            img_flipped.save(buffer, format='JPEG', quality=85)
-            flipped_bytes = buffer.getvalue()
+            # Check if this is the first instruction (confirming destination)
+            is_first = not recent_instructions
             
-            print(f"🔄 Image flipped for correct orientation")
+            # Near-identical frame for the same target? Reuse that plan
+            if _semantic_cache is not None:
+                bucket = scene_bucket(checkpoint, language, detections, is_first=is_first)
+                phash = perceptual_hash(img)
+                cached = _semantic_cache.get(bucket, phash)
+                if cached is not None:
+                    logger.debug("♻️ Reusing cached plan (%s hits)", _semantic_cache.stats["hits"])
+                    return cached
             
-            # Encode flipped image to base64
-            image_b64 = base64.b64encode(flipped_bytes).decode('utf-8')
+            if not flip_image and img.format == 'JPEG' and max(original_size) <= VISION_SIZE:
+                # Already mirrored on device and small enough: send as-is
+                flipped_bytes = image_bytes
+            else:
+                # Downscale, flip (iOS camera issue) and re-encode
+                flipped_bytes = encode_vision_frame(img, flip=flip_image)
+                logger.debug("🔄 Image re-encoded for the vision model (%s bytes)", len(flipped_bytes))
             
-            # Check if this is the first instruction (confirming destination)
-            is_first = not recent_instructions or len(recent_instructions) == 0
+            # Build the data URL in bytes and decode once (base64 is pure ASCII)
+            image_url = (b"data:image/jpeg;base64," + base64.b64encode(flipped_bytes)).decode('ascii')
             
-            # Language names mapping
-            lang_names = {
-                'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German',
-                'it': 'Italian', 'pt': 'Portuguese', 'hi': 'Hindi', 'ar': 'Arabic',
-                'ru': 'Russian', 'zh': 'Chinese', 'ja': 'Japanese', 'ko': 'Korean'
-            }
-            lang_name = lang_names.get(language, 'English')
+            # Dynamic context as canonical JSON, after the static prefix
+            context = compact_json({
+                "target": checkpoint,
+                "recent": [] if is_first else recent_tail(recent_instructions, 2),
+                "lang": LANG_NAMES.get(language, "ENGLISH")
+            })
             
-            if is_first:
-                user_message = f"""User wants to go to: {checkpoint}
-
-Look at what the camera sees. DESCRIBE what's there.
-
-If you see {checkpoint}: "I see the {checkpoint} straight ahead!"
-If you don't see it: "I see [what's actually there]. Let's find the {checkpoint}."
-
-USER IS BLIND - DESCRIBE, don't ask questions!
-**RESPOND IN {lang_name.upper()}**. SHORT (10-15 words). JSON format."""
-            else:
-                user_message = f"""User is navigating to: {checkpoint}
-
-Look at the camera view. DESCRIBE what you see:
-- What's directly in their path?
-- Any obstacles or dangers?
-- Where is {checkpoint} relative to them?
-
-Recent guidance: {recent_instructions[-2:]}
-
-USER IS BLIND - DESCRIBE clearly, don't ask!
-**RESPOND IN {lang_name.upper()}**. SHORT (10-15 words). JSON format."""
-
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": user_message},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_b64}",
-                                    "detail": "low"  # Faster processing
-                                }
+            vision_messages = [
+                SYSTEM_MESSAGE,
+                FIRST_FRAME_MESSAGE if is_first else NEXT_FRAME_MESSAGE,
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": context},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url,
+                                "detail": "low"  # Faster processing
                             }
-                        ]
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=150,
-                response_format={"type": "json_object"}
-            )
+                        }
+                    ]
+                }
+            ]
+            
+            # Only time out early when there are detections to fall back on
+            can_fall_back = bool(detections) or detection_future is not None
+            try:
+                result = stream_json_completion(
+                    client,
+                    model=model,
+                    messages=vision_messages,
+                    timeout=VISION_TIMEOUT if can_fall_back else None
+                )
+            except (APITimeoutError, TimeoutError):
+                if not can_fall_back:
+                    raise
+                # Vision is too slow right now; plan from the detections instead
+                logger.warning("⚠️ Vision call timed out, using YOLO detections only")
+                if detections:
+                    user_message = detection_prompt(checkpoint, detections, recent_instructions, language)
+                else:
+                    detected = detection_future.result(timeout=VISION_TIMEOUT)
+                    user_message = detection_prompt(
+                        checkpoint,
+                        detected["detections"],
+                        recent_instructions,
+                        language,
+                        detected["img_w"],
+                        detected["img_h"]
+                    )
+                result = stream_json_completion(
+                    client,
+                    model=model,
+                    messages=[
+                        SYSTEM_MESSAGE,
+                        {"role": "user", "content": user_message}
+                    ]
+                )
         else:
             # Fallback: Use YOLO detections only
-            print(f"⚠️ No image provided, using YOLO detections only")
-            
-            img_w = 1280
-            img_h = 720
+            logger.debug("⚠️ No image provided, using YOLO detections only")
             
-            enhanced_detections = [
-                estimate_depth_and_position(det, img_w, img_h) 
-                for det in detections
-            ]
-            enhanced_detections.sort(key=lambda x: x["distance_feet"])
-            
-            scene_description = []
-            for det in enhanced_detections[:5]:
-                desc = f"- {det['object']}: {det['distance']} away, {det['position']} side"
-                if det['is_direct_obstacle']:
-                    desc += " ⚠️ BLOCKING PATH"
-                scene_description.append(desc)
+            user_message = detection_prompt(checkpoint, detections, recent_instructions, language)
             
-            user_message = f"""Target: {checkpoint}
-
-Scene: {chr(10).join(scene_description) if scene_description else "Clear path"}
-
-Recent: {recent_instructions[-3:] if recent_instructions else ["Starting"]}
-
-JSON instruction:"""
-
-            response = client.chat.completions.create(
+            result = stream_json_completion(
+                client,
                 model=model,
                 messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
+                    SYSTEM_MESSAGE,
                     {"role": "user", "content": user_message}
-                ],
-                temperature=0.3,
-                max_tokens=150,
-                response_format={"type": "json_object"}
+                ]
             )
         
-        result = json.loads(response.choices[0].message.content)
-        
-        return {
+        plan = {
             "instruction": result.get("instruction", "Continue forward."),
-            "urgency": result.get("urgency", "normal"),
+            "urgency": intern_label(result.get("urgency", "normal")),
             "reached": result.get("reached", False),
-            "danger_level": result.get("danger_level", "safe")
+            "danger_level": intern_label(result.get("danger_level", "safe"))
         }
+        if cache_key is not None:
+            _plan_cache.put(cache_key, plan)
+        if phash is not None:
+            _semantic_cache.put(bucket, phash, plan)
+        return plan
         
     except Exception as e:
-        print(f"Planning error: {e}")
+        logger.error("Planning error: %s", e)
         # Fallback instruction
         return {
             "instruction": "Continue forward carefully.",
@@ -0,0 +1,202 @@
+"""
+Plan caches for navigation planning.
+Reuses recent instructions when the scene hasn't changed, so a user
+standing still doesn't trigger an LLM call on every frame.
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Sequence
+import numpy as np
+import orjson
+from PIL import Image
+
+
+# ============================================================================
+# Perceptual hash
+# ============================================================================
+
+_HASH_SIZE = 8
+_HASH_SAMPLE = 32
+
+# Orthonormal DCT-II basis for the 32x32 downsample (computed once)
+_k = np.arange(_HASH_SAMPLE)
+_DCT = np.sqrt(2 / _HASH_SAMPLE) * np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _HASH_SAMPLE))
+_DCT[0] /= np.sqrt(2)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    64-bit DCT perceptual hash (pHash) of an image.
+    
+    Downsamples to 32x32 grayscale, takes the 8x8 low-frequency DCT
+    block and sets one bit per coefficient above the median.
+    
+    Args:
+        image: PIL image
+    
+    Returns:
+        Hash as an int
+    """
+    small = image.convert('L').resize((_HASH_SAMPLE, _HASH_SAMPLE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float32)
+    
+    coeffs = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    bits = coeffs > np.median(coeffs[1:])  # DC term skews the median
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+# ============================================================================
+# Exact cache (detection-only prompts)
+# ============================================================================
+
+def plan_cache_key(
+    checkpoint: str,
+    detections: List[Dict[str, Any]],
+    recent_instructions: Sequence[str],
+    language: str
+) -> bytes:
+    """
+    Stable hash of the inputs that shape a detection-only prompt.
+    Boxes are rounded to 10px so near-identical scenes share a key.
+    """
+    top = sorted(detections, key=lambda d: d.get("conf", 0), reverse=True)[:10]
+    rounded = sorted(
+        [d.get("cls"), [round(v, -1) for v in d.get("xywh", [])]]
+        for d in top
+    )
+    last = recent_instructions[-1] if recent_instructions else None
+    payload = orjson.dumps([checkpoint, language, rounded, last])
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class PlanCache:
+    """Thread-safe LRU of plan results with a TTL."""
+    
+    def __init__(self, ttl: float = 2.0, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result, or None if missing/expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(result)
+    
+    def put(self, key: bytes, result: Dict[str, Any]):
+        """Store a result, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+# ============================================================================
+# Semantic cache (vision prompts)
+# ============================================================================
+
+def scene_bucket(
+    checkpoint: str,
+    language: str,
+    detections: List[Dict[str, Any]],
+    top_k: int = 5,
+    is_first: bool = False
+) -> bytes:
+    """
+    Exact part of the semantic key: target, language, first frame vs
+    follow-up, and top-k classes. Frames are then matched within a
+    bucket by perceptual hash.
+    
+    The class list only guards against new obstacles when the caller
+    actually supplies detections; with none it is empty and the pHash
+    alone decides.
+    """
+    top = sorted(detections, key=lambda d: d.get("conf", 0), reverse=True)[:top_k]
+    classes = sorted(d.get("cls", "") for d in top)
+    turn = "first" if is_first else "next"
+    payload = "|".join([checkpoint.strip().lower(), language, turn, *classes]).encode()
+    return hashlib.sha256(payload).digest()
+
+
+class SemanticPlanCache:
+    """
+    Thread-safe plan cache matching frames by perceptual-hash distance.
+    
+    Entries are grouped by scene_bucket(); within a bucket a frame hits
+    if its pHash is within max_distance bits of a cached frame. Buckets
+    only hold the frames seen in the last ttl seconds, so a linear scan
+    is cheaper than an index.
+    
+    Warning results are never cached, and they flush their bucket so
+    stale "all clear" plans aren't served after a danger signal.
+    """
+    
+    def __init__(self, ttl: float = 12.0, max_size: int = 256, max_distance: int = 4):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.stats = {"hits": 0, "misses": 0}
+        self._buckets: "OrderedDict[bytes, List[Tuple[int, float, Dict[str, Any]]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, bucket: bytes, phash: int) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest cached plan for this frame, if any."""
+        now = time.monotonic()
+        with self._lock:
+            entries = self._buckets.get(bucket)
+            best = None
+            if entries:
+                fresh = [e for e in entries if now - e[1] <= self.ttl]
+                self._size -= len(entries) - len(fresh)
+                if fresh:
+                    self._buckets[bucket] = fresh
+                    self._buckets.move_to_end(bucket)
+                else:
+                    del self._buckets[bucket]
+                for cached_hash, _, result in fresh:
+                    distance = hamming(phash, cached_hash)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, result)
+            
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return dict(best[1])
+    
+    def put(self, bucket: bytes, phash: int, result: Dict[str, Any]):
+        """Store a plan for this frame (warnings flush the bucket instead)."""
+        with self._lock:
+            if result.get("urgency") == "warning":
+                self._size -= len(self._buckets.pop(bucket, []))
+                return
+            
+            self._buckets.setdefault(bucket, []).append((phash, time.monotonic(), dict(result)))
+            self._buckets.move_to_end(bucket)
+            self._size += 1
+            
+            # Evict oldest entries from the least recently used buckets
+            while self._size > self.max_size:
+                oldest_bucket, entries = next(iter(self._buckets.items()))
+                entries.pop(0)
+                self._size -= 1
+                if not entries:
+                    del self._buckets[oldest_bucket]
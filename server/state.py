@@ -3,47 +3,55 @@ Server-side state management.
 Tracks scene context and danger awareness.
 """
 
-from typing import List, Dict, Any
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
-# Global state (in-memory, simple)
-_scene_state = {
-    "last_checkpoint": None,
-    "last_detections": [],
-    "last_analysis": None,
-    "danger_level": "safe",  # safe, caution, danger
-    "timestamp": None,
-    "obstacles_ahead": [],
-}
 
+@dataclass(frozen=True, slots=True)
+class SceneState:
+    """Immutable snapshot of the current scene."""
+    last_checkpoint: Optional[str] = None
+    last_detections: Tuple[Dict[str, Any], ...] = ()
+    last_analysis: Optional[Dict[str, Any]] = None
+    danger_level: str = "safe"  # safe, caution, danger
+    timestamp: Optional[datetime] = None
+    obstacles_ahead: Tuple[Dict[str, Any], ...] = ()
+    recent_instructions: Tuple[str, ...] = ()
 
-def update_scene(checkpoint: str, detections: List[Dict], analysis: Dict):
-    """Update global scene state."""
-    global _scene_state
-    _scene_state = {
-        "last_checkpoint": checkpoint,
-        "last_detections": detections,
-        "last_analysis": analysis,
-        "danger_level": analysis.get("danger_level", "safe"),
-        "timestamp": datetime.now(),
-        "obstacles_ahead": [d for d in detections if d.get("is_direct_obstacle")],
-    }
 
+# Most recent instructions kept per session (older ones are dropped)
+MAX_RECENT_INSTRUCTIONS = 10
 
-def get_scene():
-    """Get current scene state."""
-    return _scene_state
+# Global state (in-memory, simple). Replaced wholesale on every update;
+# rebinding a module global is atomic, so readers always see a full snapshot.
+_state = SceneState()
+
+
+def update_scene(checkpoint: str, detections: List[Dict], analysis: Dict):
+    """Update global scene state."""
+    global _state
+    detections = tuple(detections)
+    recent = _state.recent_instructions
+    if analysis.get("instruction"):
+        recent = (*recent[-(MAX_RECENT_INSTRUCTIONS - 1):], analysis["instruction"])
+    _state = SceneState(
+        last_checkpoint=checkpoint,
+        last_detections=detections,
+        last_analysis=analysis,
+        danger_level=analysis.get("danger_level", "safe"),
+        timestamp=datetime.now(),
+        obstacles_ahead=tuple(d for d in detections if d.get("is_direct_obstacle")),
+        recent_instructions=recent,
+    )
+
+
+def get_scene() -> SceneState:
+    """Get current scene state (immutable snapshot)."""
+    return _state
 
 
 def clear_scene():
     """Reset scene state."""
-    global _scene_state
-    _scene_state = {
-        "last_checkpoint": None,
-        "last_detections": [],
-        "last_analysis": None,
-        "danger_level": "safe",
-        "timestamp": None,
-        "obstacles_ahead": [],
-    }
-
+    global _state
+    _state = SceneState()
@@ -4,33 +4,66 @@ Handles M4A files natively!
 """
 
 import os
+import logging
+import importlib.util
 from io import BytesIO
+from typing import BinaryIO, Union
+import httpx
 from openai import OpenAI
 
+logger = logging.getLogger(__name__)
 
-def transcribe_audio(audio_bytes: bytes, filename: str = "audio.m4a", language: str = "en") -> str:
+# HTTP/2 needs the optional h2 package
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+# Global Whisper client (created on first use, reused across requests)
+_whisper_client = None
+
+def get_whisper_client() -> OpenAI:
+    """Get or create the shared OpenAI Whisper client (keeps connections alive)."""
+    global _whisper_client
+    if _whisper_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not set in .env!")
+        
+        _whisper_client = OpenAI(
+            api_key=api_key,
+            http_client=httpx.Client(
+                http2=_HTTP2,
+                limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60)
+            )
+        )
+    return _whisper_client
+
+
+def transcribe_audio(audio: Union[bytes, BinaryIO], filename: str = "audio.m4a", language: str = "en") -> str:
     """
     Transcribe audio using OpenAI Whisper API.
     
     Args:
-        audio_bytes: Audio file bytes (M4A from iPhone)
+        audio: Audio file bytes or file-like stream (M4A from iPhone)
         filename: Original filename
         language: ISO language code (e.g., 'en', 'es', 'fr')
         
     Returns:
         Transcribed text
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set in .env!")
-    
-    client = OpenAI(api_key=api_key)
+    client = get_whisper_client()
     
-    print(f"🎙️ Transcribing {len(audio_bytes)} bytes with Whisper ({language})...")
+    logger.debug("🎙️ Transcribing %s with Whisper (%s)...", filename, language)
     
-    # Create file-like object from bytes
-    audio_file = BytesIO(audio_bytes)
-    audio_file.name = filename  # Whisper needs a filename
+    # Whisper needs a filename. Raw bytes get a named BytesIO; streams
+    # (e.g. spooled uploads) go in a (filename, file) tuple. Either way the
+    # SDK hands the file object to httpx, which streams it without a copy.
+    if isinstance(audio, (bytes, bytearray)):
+        audio_file = BytesIO(audio)
+        audio_file.name = filename
+    else:
+        if audio.seekable():
+            audio.seek(0)  # Upload parsing may leave the stream at EOF
+        audio_file = (filename, audio)
     
     try:
         # Call Whisper API (supports M4A natively!)
@@ -41,9 +74,9 @@ def transcribe_audio(audio_bytes: bytes, filename: str = "audio.m4a", language:
         )
         
         transcript = response.text.strip()
-        print(f"✅ Whisper: '{transcript}'")
+        logger.debug("✅ Whisper: '%s'", transcript)
         return transcript
         
     except Exception as e:
-        print(f"❌ Whisper error: {e}")
+        logger.error("❌ Whisper error: %s", e)
         raise
@@ -3,8 +3,11 @@ Text-to-speech passthrough - returns text for iOS TTS.
 Simpler and more reliable after microphone recording!
 """
 
+import logging
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 # Keep for compatibility
 STATIC_DIR = Path(__file__).parent / "static"
 STATIC_DIR.mkdir(exist_ok=True)
@@ -20,5 +23,6 @@ def synthesize_speech(text: str) -> str:
     Returns:
         Same text (iOS handles TTS)
     """
-    print(f"🎤 iOS TTS: '{text[:60]}...'")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🎤 iOS TTS: '%.60s...'", text)
     return text
@@ -0,0 +1,197 @@
+"""
+Dedicated YOLO inference process.
+Owns the YOLODetector so Flask workers never import torch or hold the GIL
+during inference; they only send JPEG bytes and receive detection dicts.
+"""
+
+import os
+import time
+import logging
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+def _serve(requests, responses):
+    """
+    Inference process main loop.
+    
+    Args:
+        requests: Queue of (req_id, image_bytes) tuples (None to stop)
+        responses: Queue of (req_id, result, error) tuples
+    """
+    try:
+        from model import get_detector  # torch is only imported in this process
+        detector = get_detector()
+    except Exception as e:
+        responses.put((None, None, f"YOLO failed to load: {e}"))
+        return
+    responses.put((None, None, None))  # Signal ready
+    
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        req_id, image_bytes = item
+        
+        # submit() lets the detector micro-batch across Flask workers
+        try:
+            future = detector.submit(image_bytes)
+        except Exception as e:
+            responses.put((req_id, None, str(e)))
+            continue
+        
+        def _reply(done: Future, req_id=req_id):
+            error = done.exception()
+            if error is not None:
+                responses.put((req_id, None, str(error)))
+            else:
+                responses.put((req_id, done.result(), None))
+        
+        future.add_done_callback(_reply)
+
+
+# How long to wait for the model to load, and how often to check the process
+YOLO_STARTUP_TIMEOUT = float(os.getenv("YOLO_STARTUP_TIMEOUT", 300))
+_POLL_INTERVAL = 1.0
+
+
+class DetectorClient:
+    """Sends images to the YOLO process and resolves results as futures."""
+    
+    def __init__(self):
+        ctx = multiprocessing.get_context("spawn")  # CUDA can't be forked
+        self._requests = ctx.Queue()
+        self._responses = ctx.Queue()
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        
+        self._process = ctx.Process(
+            target=_serve,
+            args=(self._requests, self._responses),
+            name="yolo-server",
+            daemon=True
+        )
+        self._process.start()
+        self._wait_ready()
+        logger.info("✓ YOLO inference process ready")
+        
+        threading.Thread(target=self._dispatch, name="yolo-client", daemon=True).start()
+    
+    def _wait_ready(self):
+        """Block until the model has loaded; raise if the process dies or stalls."""
+        deadline = time.monotonic() + YOLO_STARTUP_TIMEOUT
+        while True:
+            try:
+                _, _, error = self._responses.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError(f"YOLO process exited during startup (code {self._process.exitcode})")
+                if time.monotonic() > deadline:
+                    self._process.terminate()
+                    raise RuntimeError("YOLO process did not become ready in time")
+                continue
+            if error is not None:
+                self._process.join(timeout=_POLL_INTERVAL)
+                raise RuntimeError(error)
+            return
+    
+    def _fail_pending(self, error: Exception):
+        """Fail every waiting future (the inference process is gone)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+    
+    @property
+    def alive(self) -> bool:
+        """Whether the inference process is still running."""
+        return self._process.is_alive()
+    
+    def _dispatch(self):
+        """Route responses from the inference process to waiting futures."""
+        while True:
+            try:
+                req_id, result, error = self._responses.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._fail_pending(RuntimeError(f"YOLO process exited (code {self._process.exitcode})"))
+                    return
+                continue
+            with self._lock:
+                future = self._pending.pop(req_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+    
+    def submit(self, image_bytes: bytes) -> Future:
+        """Queue JPEG bytes for detection."""
+        if not self._process.is_alive():
+            raise RuntimeError(f"YOLO process exited (code {self._process.exitcode})")
+        future = Future()
+        req_id = next(self._ids)
+        with self._lock:
+            self._pending[req_id] = future
+        self._requests.put((req_id, image_bytes))
+        return future
+    
+    def detect(self, image_bytes: bytes, timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Run object detection in the inference process.
+        
+        Args:
+            image_bytes: JPEG image bytes
+            timeout: Seconds to wait for the result
+        
+        Returns:
+            Dict with img_w, img_h, and detections array
+        """
+        return self.submit(image_bytes).result(timeout=timeout)
+
+
+# After a failed start, wait this long before spawning the process again
+YOLO_RETRY_INTERVAL = float(os.getenv("YOLO_RETRY_INTERVAL", 60))
+
+# Global client (inference process started on first use or by start_detector_client)
+_client = None
+_client_lock = threading.Lock()
+_last_failure = (0.0, None)  # (monotonic time, error)
+
+def get_detector_client() -> DetectorClient:
+    """Get or start the global YOLO inference process client."""
+    global _client, _last_failure
+    with _client_lock:
+        if _client is None or not _client.alive:
+            failed_at, error = _last_failure
+            if error is not None and time.monotonic() - failed_at < YOLO_RETRY_INTERVAL:
+                raise RuntimeError(f"YOLO unavailable (retrying later): {error}")
+            try:
+                _client = DetectorClient()
+            except Exception as e:
+                _client = None
+                _last_failure = (time.monotonic(), e)
+                raise
+    return _client
+
+
+def start_detector_client():
+    """
+    Start the YOLO process in the background of this worker, so the first
+    request doesn't pay for model load, export and warmup. Requests that
+    arrive meanwhile wait on the same start instead of spawning another.
+    """
+    def _start():
+        try:
+            get_detector_client()
+        except Exception as e:
+            logger.error("YOLO preload failed: %s", e)
+    
+    threading.Thread(target=_start, name="yolo-preload", daemon=True).start()